@@ -15,6 +15,10 @@ from episode import episode
 from statistic import statistic
 from agent import player
 from agent import rndenv
+from agent import rollout_player
+from metrics import metrics
+from profiler import profiler
+import shutil
 import sys
 
 
@@ -23,9 +27,11 @@ if __name__ == '__main__':
     print()
     
     total, block, limit = 1000, 0, 0
-    play_args, evil_args = "", ""
+    play_type, play_args, evil_args = player, "", ""
     load, save = "", ""
     summary = False
+    monitor, interval = "", 5
+    window, dump = "", ""
     for para in sys.argv[1:]:
         if "--total=" in para:
             total = int(para[(para.index("=") + 1):])
@@ -33,6 +39,12 @@ if __name__ == '__main__':
             block = int(para[(para.index("=") + 1):])
         elif "--limit=" in para:
             limit = int(para[(para.index("=") + 1):])
+        elif "--agent=" in para:
+            agents = { "dummy": player, "rollout": rollout_player }
+            name = para[(para.index("=") + 1):]
+            if name not in agents:
+                raise ValueError("unknown agent: %s (expect %s)" % (name, "|".join(agents)))
+            play_type = agents[name]
         elif "--play=" in para:
             play_args = para[(para.index("=") + 1):]
         elif "--evil=" in para:
@@ -43,39 +55,79 @@ if __name__ == '__main__':
             save = para[(para.index("=") + 1):]
         elif "--summary" in para:
             summary = True
+        elif "--metrics=" in para:
+            monitor = para[(para.index("=") + 1):]
+        elif "--metrics-interval=" in para:
+            interval = float(para[(para.index("=") + 1):])
+        elif "--profile=" in para:
+            window = para[(para.index("=") + 1):]
+        elif para == "--profile":
+            window = profiler.default
+        elif "--profile-dump=" in para:
+            dump = para[(para.index("=") + 1):]
     
     stat = statistic(total, block, limit)
+    prof = profiler(window, dump)
     
+    resume = None
     if load:
-        input = open(load, "r")
-        stat.load(input)
-        input.close()
+        # restore from the checkpoint if possible, otherwise replay the whole file
+        resume = stat.load_checkpoint(load)
+        if resume is None:
+            input = open(load, "r")
+            stat.load(input)
+            input.close()
         summary |= stat.is_finished()
     
-    with player(play_args) as play, rndenv(evil_args) as evil:
+    if save and resume is not None:
+        # the episodes of a resumed run are appended to the loaded file as they close
+        if save != load:
+            shutil.copyfile(load, save)
+        stat.output = open(save, "a")
+    
+    with play_type(play_args) as play, rndenv(evil_args) as evil, metrics(stat, play, monitor, interval):
+        if resume is not None:
+            evil.set_state(resume)
         while not stat.is_finished():
+            timer = prof.timer(stat.count + 1)
             play.open_episode("~:" + evil.name())
             evil.open_episode(play.name() + ":~")
+            timer.add("open_episode")
             
             stat.open_episode(play.name() + ":" + evil.name())
             game = stat.back()
+            timer.add("statistic")
             while True:
                 # Play and environment plays in turns
                 who = game.take_turns(play, evil)
+                timer.add("statistic")
                 move = who.take_action(game.state())
-                if not game.apply_action(move) or who.check_for_win(game.state()):
+                timer.add("player.take_action" if who is play else "rndenv.take_action")
+                applied = game.apply_action(move)
+                timer.add("episode.apply_action")
+                won = applied and who.check_for_win(game.state())
+                timer.add("check_for_win")
+                if not applied or won:
                     break
             win = game.last_turns(play, evil)
             stat.close_episode(win.name())
+            timer.add("statistic")
             play.close_episode(stat.back().ep_moves, win.name())
             evil.close_episode(win.name())
+            timer.add("close_episode")
+            timer.close(stat)
+        state = evil.get_state()
     
     if summary:
         stat.summary()
     
     if save:
-        output = open(save, "w")
-        stat.save(output)
-        output.close()
+        if stat.output is not None:
+            stat.output.close()
+        else:
+            output = open(save, "w")
+            stat.save(output)
+            output.close()
+        stat.save_checkpoint(save, state)
     
         
@@ -12,8 +12,16 @@ Modifier: Kuo-Hao Ho (lukewayne123)
 from board import board
 from action import action
 from weight import weight
+from weight import quantized_weight
+from weight import sparse_weight
 from array import array
 from episode import episode
+import bitboard
+import kernel
+from transposition import transposition
+from endgame import endgame
+from replay import replay
+from multiprocessing import Pool
 import random
 import sys
 import copy
@@ -80,6 +88,17 @@ class random_agent(agent):
     def shuffle(self, seq):
         random.shuffle(seq)
         return
+    
+    def get_state(self):
+        """ return the state of the random generator as a list, i.e., [version, internal state, gauss_next] """
+        version, internal, gauss = random.getstate()
+        return [version, list(internal), gauss]
+    
+    def set_state(self, state):
+        """ restore the state of the random generator from get_state """
+        version, internal, gauss = state
+        random.setstate((version, tuple(internal), gauss))
+        return
 
     def close_episode(self, ep, flag = ""):
         return 
@@ -98,10 +117,20 @@ class weight_agent(agent):
         load = self.property("load")
         if load is not None:
             self.load_weights(load)
+        quantize = self.property("quantize")
+        if quantize is not None:
+            self.quantize_weights(quantize)
         self.alpha = 0.025
+        self.updates = 0
         alpha = self.property("alpha")
         if alpha is not None:
-            self.alpha = alpha
+            self.alpha = float(alpha)
+        self.buffer = None
+        capacity = self.property("replay")
+        if capacity is not None:
+            self.buffer = replay(int(capacity))
+        self.batch = int(self.property("batch") or 256)
+        self.minibatches = int(self.property("minibatches") or 4)
         return
     
     def __exit__(self, exc_type, exc_value, traceback):
@@ -110,19 +139,25 @@ class weight_agent(agent):
             self.save_weights(save)
         return
     
-    def init_weights(self):
-        self.net += [weight(65536)] # feature for line [0 1 2 3] includes 16*16*16*16 possible
-        self.net += [weight(65536)] # feature for line [4 5 6 7] includes 16*16*16*16 possible
+    def init_weights(self, info = ""):
+        self.net += [self.make_weight(65536)] # feature for line [0 1 2 3] includes 16*16*16*16 possible
+        self.net += [self.make_weight(65536)] # feature for line [4 5 6 7] includes 16*16*16*16 possible
         return
     
+    def make_weight(self, size):
+        """ allocate a weight table, which is paged if option 'page' is given """
+        page = self.property("page")
+        if page is not None:
+            return sparse_weight(size, int(page))
+        return weight(size)
+    
     def load_weights(self, path):
         input = open(path, 'rb')
         size = array('L')
         size.fromfile(input, 1)
         size = size[0]
         for i in range(size):
-            self.net += [weight()]
-            self.net[-1].load(input)
+            self.net += [weight.parse(input)]
         return
     
     def save_weights(self, path):
@@ -131,12 +166,43 @@ class weight_agent(agent):
         for w in self.net:
             w.save(output)
         return
+    
+    def quantize_weights(self, mode = "float16", samples = 1000):
+        """
+        convert the weight tables to reduced-precision storage (evaluation only)
+        print and return the (max, mean, rms) error of each table against float32,
+        and the (max, mean) error of lineValue over 'samples' random boards
+        """
+        rng = random.Random(samples)
+        boards = [board([rng.choice([0, 0, 0, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]) for i in range(16)]) for n in range(samples)]
+        reference = self.batchValue(boards) if len(self.net) >= 2 else []
+        errors = []
+        for i, w in enumerate(self.net):
+            if isinstance(w, sparse_weight):
+                errors += [None]
+                print("quantize %s: net[%d] is paged, skipped" % (mode, i))
+                continue
+            q = quantized_weight(0, mode).convert(w)
+            errors += [q.error(w)]
+            self.net[i] = q
+            print("quantize %s: net[%d] max = %g, mean = %g, rms = %g" % ((mode, i) + errors[-1]))
+        value = None
+        if reference:
+            diffs = [abs(v - r) for v, r in zip(self.batchValue(boards), reference)]
+            value = max(diffs), sum(diffs) / len(diffs)
+            print("quantize %s: lineValue of %d boards max = %g, mean = %g" % ((mode, samples) + value))
+        return errors, value
 
     def open_episode(self, flag = ""):
         self.episode.clear()
         return
 
     def close_episode(self, ep, flag = ""):
+        if self.buffer is not None:
+            # afterstates of the player and their rewards, i.e., (state, action, reward, time) of slides
+            self.buffer.push([move[0] for move in ep[2::2]], [move[2] for move in ep[2::2]])
+            for i in range(self.minibatches):
+                self.learn(self.batch)
         episode = ep[2:].copy()
         # backward
         episode.reverse()
@@ -148,6 +214,41 @@ class weight_agent(agent):
             ###
         return
 
+    def learn(self, count):
+        """
+        apply TD(0) updates of afterstates to a minibatch sampled from the replay buffer
+        V(s') <- V(s') + alpha * (r_next + V(s'_next) - V(s')), where V(s'_next) = 0 if s' is terminal
+        
+        the deltas are computed from the same values, so the deltas hitting the same entry
+        (e.g., the empty row, which almost every board has in some isomorphisms) are averaged
+        instead of summed, i.e., each entry is moved at most alpha times its mean delta
+        """
+        buffer = self.buffer
+        sample = buffer.sample(count)
+        if not sample:
+            return
+        nexts = [buffer.successor(i) for i in sample if not buffer.terminal[i]]
+        values = self.batchValue([buffer.after[i] for i in sample] + [buffer.after[i] for i in nexts])
+        values, successors = values[:len(sample)], iter(values[len(sample):])
+        deltas = []
+        for i, value in zip(sample, values):
+            target = 0 if buffer.terminal[i] else buffer.reward[buffer.successor(i)] + next(successors)
+            deltas += [target - value]
+        n = len(sample)
+        for w, indexes in zip(self.net, self.batchIndex([buffer.after[i] for i in sample])):
+            total = {}
+            for k, index in enumerate(indexes):
+                sum_count = total.get(index)
+                if sum_count is None:
+                    total[index] = [deltas[k % n], 1]
+                else:
+                    sum_count[0] += deltas[k % n]
+                    sum_count[1] += 1
+            for index, (delta, hits) in total.items():
+                w[index] += self.alpha * delta / hits
+        self.updates += n
+        return
+    
     def lineIndex(self, board_state):
         idx0 = 0
         idx1 = 0
@@ -157,6 +258,9 @@ class weight_agent(agent):
         return idx0, idx1
 
     def lineValue(self, board_state):
+        w0, w1 = kernel.table(self.net[0]), kernel.table(self.net[1])
+        if w0 is not None and w1 is not None:
+            return float(kernel.batch_value(kernel.pack([board_state]), w0, w1)[0])
         value = 0.0
         for i in range(8):
             board = copy.copy(board_state)
@@ -168,6 +272,11 @@ class weight_agent(agent):
         return value
 
     def updateLineValue(self, board_state, value):
+        w0, w1 = kernel.table(self.net[0]), kernel.table(self.net[1])
+        if w0 is not None and w1 is not None:
+            kernel.batch_update(kernel.pack([board_state]), w0, w1, kernel.numpy.array([value], dtype = kernel.numpy.float32))
+            self.updates += 1
+            return
         for i in range(8):
             board = copy.copy(board_state)
             if (i >= 4):
@@ -176,6 +285,50 @@ class weight_agent(agent):
             idx0, idx1 = self.lineIndex(board)
             self.net[0][idx0] += value
             self.net[1][idx1] += value
+        self.updates += 1
+        return
+    
+    def batchIndex(self, boards):
+        """
+        return the line indexes of all isomorphisms of boards (board objects or packed integers)
+        as two arrays aligned to isomorphism-major order, i.e., entry k * n + j is the k-th
+        isomorphism of the j-th board, where n = len(boards)
+        """
+        n = len(boards)
+        x = bitboard.join([b if isinstance(b, int) else bitboard.pack(b) for b in boards])
+        rows = bitboard.rows(bitboard.isomorphic(x, bitboard.repeat(n)), n)
+        return rows[3::4], rows[2::4]
+    
+    def batchValue(self, boards):
+        """ return the values of many boards, the same as lineValue for each board """
+        n = len(boards)
+        if not n:
+            return []
+        w0, w1 = kernel.table(self.net[0]), kernel.table(self.net[1])
+        if w0 is not None and w1 is not None:
+            return kernel.batch_value(kernel.pack(boards), w0, w1).tolist()
+        idx0, idx1 = self.batchIndex(boards)
+        w0, w1 = self.net[0], self.net[1]
+        values = [w0[i] + w1[j] for i, j in zip(idx0, idx1)]
+        return [sum(values[j::n]) for j in range(n)]
+    
+    def batchUpdate(self, boards, values):
+        """ adjust many boards by values, the same as updateLineValue for each board """
+        n = len(boards)
+        if not n:
+            return
+        w0, w1 = kernel.table(self.net[0]), kernel.table(self.net[1])
+        if w0 is not None and w1 is not None:
+            kernel.batch_update(kernel.pack(boards), w0, w1, kernel.numpy.array(values, dtype = kernel.numpy.float32))
+            self.updates += n
+            return
+        idx0, idx1 = self.batchIndex(boards)
+        w0, w1 = self.net[0], self.net[1]
+        for k, (i, j) in enumerate(zip(idx0, idx1)):
+            value = values[k % n]
+            w0[i] += value
+            w1[j] += value
+        self.updates += n
         return
 
 class learning_agent(agent):
@@ -237,6 +390,126 @@ class player(random_agent):
             return action()
 
     
+
+class rollout_player(random_agent):
+    """
+    Monte Carlo rollout player
+    for each legal action, run 'rollouts' playouts from its afterstate and
+    select the action with the maximum (reward + mean playout score)
+    
+    options:
+     rollouts=N: the number of playouts of each action (default 100)
+     depth=N: the maximum player moves of a playout, or 0 to play to the end (default 0)
+     policy=random|greedy: the player policy of playouts (default random)
+     workers=N: the number of processes running playouts (default 1)
+     cache=PATH: the persistent transposition cache of playout scores (default none)
+     entries=N: the number of entries of a new cache file (default 1048576)
+     endgame=PATH: the endgame table (see endgame.py) to evaluate playouts cut by depth (default none)
+    """
+    
+    def __init__(self, options = ""):
+        super().__init__("name=rollout role=player " + options)
+        self.rollouts = int(self.property("rollouts") or 100)
+        self.depth = int(self.property("depth") or 0)
+        self.policy = self.property("policy") or "random"
+        self.workers = int(self.property("workers") or 1)
+        if self.rollouts < 1 or self.workers < 1:
+            raise ValueError("rollouts and workers must be at least 1: rollouts=%d workers=%d" % (self.rollouts, self.workers))
+        self.pool = None
+        self.endgame = self.property("endgame")
+        self.cache = None
+        cache = self.property("cache")
+        if cache is not None:
+            # the values of playouts depend on the policy and the endgame table, while the depth is kept per entry
+            config = "policy=%s endgame=%s" % (self.policy, self.endgame or "")
+            if self.endgame is not None:
+                with endgame(self.endgame) as table:
+                    config += " rows=%d cap=%d" % (table.rows, table.cap)
+            self.cache = transposition(cache, int(self.property("entries") or 1 << 20), config)
+        return
+    
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = Pool(self.workers)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.cache is not None:
+            self.cache.report()
+            self.cache.close()
+        return
+    
+    def take_action(self, state):
+        x = bitboard.pack(state)
+        moves = [(op,) + bitboard.slide(x, op) for op in range(4)]
+        moves = [(op, after, reward) for op, after, reward in moves if reward != -1]
+        if not moves:
+            return action()
+        # the mean playout scores of afterstates found in the cache are reused
+        depth = self.depth if self.depth else transposition.full
+        cached = [self.cache.lookup(after, depth) if self.cache is not None else None for op, after, reward in moves]
+        search = [(op, after, reward) for (op, after, reward), mean in zip(moves, cached) if mean is None]
+        # split the playouts of each action into one batch per worker
+        split = max(min(self.workers, self.rollouts), 1)
+        batches = [(after, self.rollouts // split + (i < self.rollouts % split), self.depth, self.policy, random.getrandbits(64), self.endgame)
+                   for op, after, reward in search for i in range(split)]
+        if self.pool is not None:
+            scores = self.pool.map(playout, batches)
+        else:
+            scores = list(map(playout, batches))
+        means = iter([sum(scores[k * split:(k + 1) * split]) / self.rollouts for k in range(len(search))])
+        values = []
+        for (op, after, reward), mean in zip(moves, cached):
+            if mean is None:
+                mean = next(means)
+                if self.cache is not None:
+                    self.cache.store(after, mean, depth)
+            values += [reward + mean]
+        best = max(range(len(moves)), key = values.__getitem__)
+        return action.slide(moves[best][0])
+
+
+def playout(batch):
+    """
+    play a batch of games from the same afterstate in lockstep with rndenv tile probabilities
+    return the total score of the batch, see rollout_player
+    """
+    after, count, depth, policy, seed, table = batch
+    rng = random.Random(seed)
+    games = [after] * count
+    total, step = 0, 0
+    while games and (not depth or step < depth):
+        alive = []
+        for x in games:
+            empty = bitboard.empty(x)
+            x = bitboard.place(x, rng.choice(empty), 1 if rng.random() < 0.9 else 2)
+            moves = [bitboard.slide(x, op) for op in range(4)]
+            moves = [(after, reward) for after, reward in moves if reward != -1]
+            if not moves:
+                continue
+            if policy == "greedy":
+                best = max(reward for after, reward in moves)
+                moves = [(after, reward) for after, reward in moves if reward == best]
+            after, reward = rng.choice(moves)
+            total += reward
+            alive += [after]
+        games = alive
+        step += 1
+    if table is not None:
+        # games cut by depth are afterstates, evaluated by the best edge region in the endgame table
+        table = endgames[table] if table in endgames else endgames.setdefault(table, endgame(table))
+        for x in games:
+            values = [table.after_value(bitboard.unpack(bitboard.rotate(x, rot))) for rot in range(4)]
+            total += max([v for v in values if v is not None], default = 0)
+    return total
+
+endgames = {} # endgame tables opened by this process, see playout
+
+
 if __name__ == '__main__':
     print('2048 Demo: agent.py\n')
     pass
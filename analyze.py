@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""
+Offline analytics of saved statistic files (Python 3)
+
+usage: analyze.py [--workers=N] [--block=N] [--chunk=BYTES] [--bucket=N] FILE...
+
+the files are split into byte ranges which are streamed in parallel by
+worker processes, each of which replays its episodes one line at a time,
+and the partial results are merged at the end, so memory usage does not
+depend on the size of the files
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from board import board
+from action import action
+from multiprocessing import Pool
+import os
+import sys
+
+
+class summary:
+    """ mergeable aggregates of a range of episodes """
+    
+    def __init__(self, block = 0, bucket = 100):
+        self.block = block
+        self.bucket = bucket
+        self.count = 0
+        self.score = {} # score bucket -> count
+        self.score_sum, self.score_max = 0, 0
+        self.length = {} # moves -> count
+        self.ops = {} # ops bucket (per 1000) -> count
+        self.tile = [0] * 64 # largest tile -> count
+        self.blocks = {} # block index -> [largest tile -> count]
+        self.moves = {} # action -> count
+        self.sop, self.pop, self.eop = 0, 0, 0
+        self.sdu, self.pdu, self.edu = 0, 0, 0
+        return
+    
+    def add(self, index, line):
+        """
+        add an episode in the form of 'open|moves|close' with its global index
+        return False if the line is not a valid episode
+        """
+        try:
+            delim = line.index("|"), line.index("|", line.index("|") + 1)
+            open = line[0:delim[0]]
+            close = line[(delim[1] + 1):]
+            moves = line[(delim[0] + 1):delim[1]]
+            duration = int(close[(close.index("@") + 1):]) - int(open[(open.index("@") + 1):])
+            
+            state = board()
+            score, size, pdu, edu = 0, 0, 0, 0
+            codes = []
+            i, n = 0, len(moves)
+            while i < n:
+                code = moves[i:i + 2]
+                i += 2
+                t = 0
+                if i < n and moves[i] == "[":
+                    i = moves.index("]", i) + 1
+                if i < n and moves[i] == "(":
+                    j = moves.index(")", i)
+                    t = int(moves[(i + 1):j])
+                    i = j + 1
+                if code in action.slide.res[0:4]:
+                    score += state.slide(action.slide.res.index(code))
+                    pdu += t
+                else:
+                    state.place(action.place.res.index(code[0]), action.place.res.index(code[1]))
+                    edu += t
+                codes += [code if code[0] == "#" else "+" + str((1 << action.place.res.index(code[1])) & -2)]
+                size += 1
+        except (ValueError, IndexError):
+            return False
+        
+        for key in codes:
+            self.moves[key] = self.moves.get(key, 0) + 1
+        pop = int((size - 1) / 2)
+        eop = size - pop
+        duration = duration if duration > 0 else pdu + edu
+        top = max(state.state)
+        self.count += 1
+        self.score[score // self.bucket] = self.score.get(score // self.bucket, 0) + 1
+        self.score_sum += score
+        self.score_max = max(self.score_max, score)
+        self.length[size] = self.length.get(size, 0) + 1
+        if duration > 0:
+            ops = size * 1000 // duration // 1000
+            self.ops[ops] = self.ops.get(ops, 0) + 1
+        self.tile[top] += 1
+        if self.block:
+            blk = self.blocks.setdefault(index // self.block, [0] * 64)
+            blk[top] += 1
+        self.sop, self.pop, self.eop = self.sop + size, self.pop + pop, self.eop + eop
+        self.sdu, self.pdu, self.edu = self.sdu + duration, self.pdu + pdu, self.edu + edu
+        return True
+    
+    def merge(self, other):
+        """ merge the aggregates of another summary into this one """
+        for mine, theirs in [(self.score, other.score), (self.length, other.length), (self.ops, other.ops), (self.moves, other.moves)]:
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        for key, tile in other.blocks.items():
+            blk = self.blocks.setdefault(key, [0] * 64)
+            for t in range(64):
+                blk[t] += tile[t]
+        for t in range(64):
+            self.tile[t] += other.tile[t]
+        self.count += other.count
+        self.score_sum += other.score_sum
+        self.score_max = max(self.score_max, other.score_max)
+        self.sop, self.pop, self.eop = self.sop + other.sop, self.pop + other.pop, self.eop + other.eop
+        self.sdu, self.pdu, self.edu = self.sdu + other.sdu, self.pdu + other.pdu, self.edu + other.edu
+        return self
+    
+    def percentile(self, hist, p, width = 1):
+        """ return the lower bound of the bucket containing the p-th percentile of a histogram """
+        rank, accu = p * sum(hist.values()) / 100, 0
+        for key in sorted(hist):
+            accu += hist[key]
+            if accu >= rank:
+                return key * width
+        return 0
+    
+    def reach(self, tile, count):
+        """ print the reach rates and ending rates of tiles like statistic.show """
+        c = 0
+        for t in range(0, len(tile)):
+            if c >= count:
+                break
+            if not tile[t]:
+                continue
+            accu = sum(tile[t:])
+            print("\t" "%d" "\t" "%s%%" "\t" "(%s%%)" % ((1 << t) & -2, accu * 100 / count, tile[t] * 100 / count))
+            c += tile[t]
+        return
+    
+    def show(self):
+        """ print the aggregates """
+        if not self.count:
+            print("no episode")
+            return
+        ratio = lambda op, du: op * 1000 / du if du else 0
+        print("%d\t" "avg = %d, max = %d, ops = %d (%d|%d)" % (self.count, self.score_sum / self.count, self.score_max,
+              ratio(self.sop, self.sdu), ratio(self.pop, self.pdu), ratio(self.eop, self.edu)))
+        self.reach(self.tile, self.count)
+        print()
+        
+        percentiles = [1, 10, 25, 50, 75, 90, 99]
+        print("score" "\t" + "\t".join("p%d = %d" % (p, self.percentile(self.score, p, self.bucket)) for p in percentiles))
+        print("moves" "\t" + "\t".join("p%d = %d" % (p, self.percentile(self.length, p)) for p in percentiles))
+        if self.ops:
+            print("kops" "\t" + "\t".join("p%d = %d" % (p, self.percentile(self.ops, p)) for p in percentiles))
+        total = sum(self.moves.values())
+        print("action" "\t" + "\t".join("%s = %.2f%%" % (key, self.moves[key] * 100 / total) for key in sorted(self.moves)))
+        print()
+        
+        for key in sorted(self.blocks):
+            tile = self.blocks[key]
+            print("block %d\t" "episodes %d-%d" % (key, key * self.block + 1, key * self.block + sum(tile)))
+            self.reach(tile, sum(tile))
+        if self.blocks:
+            print()
+        return
+
+
+def lines(path, start, end):
+    """ iterate over the lines of a file that start within byte range [start, end) """
+    with open(path, "rb") as input:
+        if start:
+            input.seek(start - 1)
+            input.readline()
+        while input.tell() < end:
+            line = input.readline()
+            if not line:
+                break
+            # undecodable bytes are replaced, so the line is rejected as an invalid episode by summary.add
+            yield line.decode(errors = "replace").rstrip("\r\n")
+    return
+
+
+def count(task):
+    """ count the episodes of a chunk """
+    path, start, end = task[0:3]
+    return sum(1 for line in lines(path, start, end) if line)
+
+
+def scan(task):
+    """ summarize the episodes of a chunk """
+    path, start, end, index, block, bucket = task
+    part = summary(block, bucket)
+    for line in lines(path, start, end):
+        if line:
+            part.add(index, line)
+            index += 1
+    return part
+
+
+def analyze(paths, workers = 0, block = 0, chunk = 1 << 24, bucket = 100):
+    """ analyze saved statistic files in parallel chunks and return the merged summary """
+    tasks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        tasks += [[path, start, min(start + chunk, size), 0, block, bucket] for start in range(0, size, chunk)]
+    
+    with Pool(workers if workers > 0 else None) as pool:
+        if block:
+            # the global episode index of each chunk is required to assign blocks
+            index = 0
+            for task, n in zip(tasks, pool.imap(count, tasks)):
+                task[3] = index
+                index += n
+        total = summary(block, bucket)
+        for part in pool.imap_unordered(scan, tasks):
+            total.merge(part)
+    return total
+
+
+if __name__ == '__main__':
+    print('2048 Analyze: ' + " ".join(sys.argv))
+    print()
+    
+    workers, block, chunk, bucket = 0, 0, 1 << 24, 100
+    paths = []
+    for para in sys.argv[1:]:
+        if "--workers=" in para:
+            workers = int(para[(para.index("=") + 1):])
+        elif "--block=" in para:
+            block = int(para[(para.index("=") + 1):])
+        elif "--chunk=" in para:
+            chunk = int(para[(para.index("=") + 1):])
+        elif "--bucket=" in para:
+            bucket = int(para[(para.index("=") + 1):])
+        else:
+            paths += [para]
+    
+    analyze(paths, workers, block, chunk, bucket).show()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+Packed 64-bit representation of 2048 boards
+
+a board is packed into an integer with 4 bits per cell, where cell 0 is the
+most significant nibble, so that bits [48, 64) hold row [0 1 2 3] in the
+same order as weight_agent.lineIndex, bits [32, 48) hold row [4 5 6 7], etc.;
+a nibble holds tiles up to 15 (the 32768-tile), so two 32768-tiles are never
+merged here, while board merges them into a 65536-tile (16), which cannot be packed
+
+the transformations work on all 16 cells at once with shifts and masks; they
+also work on many boards at once, where n boards are concatenated into a
+single integer of 64n bits and 'rep' is given by repeat(n)
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from array import array
+import sys
+
+
+def pack(state):
+    """ pack a board (or a list of 16 tiles) into an integer """
+    raw = 0
+    for i in range(16):
+        raw = (raw << 4) | state[i]
+    return raw
+
+
+def unpack(raw):
+    """ unpack an integer into a list of 16 tiles """
+    return [(raw >> (60 - 4 * i)) & 0x0f for i in range(16)]
+
+
+def repeat(n):
+    """ return the multiplier that repeats a 64-bit mask for n boards """
+    return ((1 << (64 * n)) - 1) // 0xffffffffffffffff
+
+
+def join(raws):
+    """ concatenate packed boards into a single integer """
+    lanes = array('Q', raws)
+    if sys.byteorder == "big":
+        lanes.byteswap()
+    return int.from_bytes(lanes.tobytes(), "little")
+
+
+def split(x, n):
+    """ split a concatenated integer into an array of n packed boards """
+    lanes = array('Q')
+    lanes.frombytes(x.to_bytes(8 * n, "little"))
+    if sys.byteorder == "big":
+        lanes.byteswap()
+    return lanes
+
+
+def rows(xs, n):
+    """
+    return an array of the 16-bit rows of concatenated integers xs, each of n boards
+    the rows of board j in xs[k] are at [4 * (k * n + j), 4 * (k * n + j) + 4),
+    from row [12 13 14 15] to row [0 1 2 3]
+    """
+    buf = array('H')
+    buf.frombytes(b"".join(x.to_bytes(8 * n, "little") for x in xs))
+    if sys.byteorder == "big":
+        buf.byteswap()
+    return buf
+
+
+def slide_row(row):
+    """
+    slide a 16-bit row to the left, the same as board.slide_left for a row,
+    except that two 32768-tiles (15) are not merged since 16 does not fit in a nibble
+    return the slid row and the reward
+    """
+    tiles = [(row >> s) & 0x0f for s in (12, 8, 4, 0)]
+    move, buf, score = [], [t for t in tiles if t], 0
+    while buf:
+        if len(buf) >= 2 and buf[0] == buf[1] and buf[0] < 15:
+            buf = buf[1:]
+            buf[0] += 1
+            score += 1 << buf[0]
+        move += [buf[0]]
+        buf = buf[1:]
+    move += [0] * (4 - len(move))
+    return (move[0] << 12) | (move[1] << 8) | (move[2] << 4) | move[3], score
+
+
+row_left, row_right, row_score = None, None, None # lookup tables, built by prepare()
+
+def prepare():
+    """ build the lookup tables of row slides """
+    global row_left, row_right, row_score
+    if row_left is not None:
+        return
+    left, right, score = array('H', [0]) * (1 << 16), array('H', [0]) * (1 << 16), array('L', [0]) * (1 << 16)
+    for row in range(1 << 16):
+        left[row], score[row] = slide_row(row)
+        rev = reflect_horizontal(row)
+        right[rev] = reflect_horizontal(left[row])
+    row_left, row_right, row_score = left, right, score
+    return
+
+
+def slide_rows(x, table):
+    """ slide each row of a board by a lookup table, return the board and the reward """
+    r0, r1, r2, r3 = (x >> 48) & 0xffff, (x >> 32) & 0xffff, (x >> 16) & 0xffff, x & 0xffff
+    y = (table[r0] << 48) | (table[r1] << 32) | (table[r2] << 16) | table[r3]
+    return y, row_score[r0] + row_score[r1] + row_score[r2] + row_score[r3]
+
+
+def slide(x, opcode):
+    """
+    apply a sliding action to a packed board, the same as board.slide for boards
+    without 32768-tiles (see slide_row)
+    return the slid board and the reward, or the same board and -1 if the action is illegal
+    """
+    prepare()
+    if opcode == 0:
+        y, score = slide_rows(transpose(x), row_left)
+        y = transpose(y)
+    elif opcode == 1:
+        y, score = slide_rows(x, row_right)
+    elif opcode == 2:
+        y, score = slide_rows(transpose(x), row_right)
+        y = transpose(y)
+    elif opcode == 3:
+        y, score = slide_rows(x, row_left)
+    else:
+        return x, -1
+    return (y, score) if y != x else (x, -1)
+
+
+def empty(x):
+    """ return the positions of empty cells """
+    return [i for i in range(16) if not (x >> (60 - 4 * i)) & 0x0f]
+
+
+def place(x, pos, tile):
+    """ place a tile (index value) to the specific position, the same as board.place """
+    return (x & ~(0x0f << (60 - 4 * pos))) | (tile << (60 - 4 * pos))
+
+
+def transpose(x, rep = 1):
+    a1 = x & (0xf0f00f0ff0f00f0f * rep)
+    a2 = x & (0x0000f0f00000f0f0 * rep)
+    a3 = x & (0x0f0f00000f0f0000 * rep)
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & (0xff00ff0000ff00ff * rep)
+    b2 = a & (0x00ff00ff00000000 * rep)
+    b3 = a & (0x00000000ff00ff00 * rep)
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def reflect_horizontal(x, rep = 1):
+    return (((x & (0x000f000f000f000f * rep)) << 12) | ((x & (0x00f000f000f000f0 * rep)) << 4)
+            | ((x >> 4) & (0x00f000f000f000f0 * rep)) | ((x >> 12) & (0x000f000f000f000f * rep)))
+
+
+def reflect_vertical(x, rep = 1):
+    return (((x & (0x000000000000ffff * rep)) << 48) | ((x & (0x00000000ffff0000 * rep)) << 16)
+            | ((x >> 16) & (0x00000000ffff0000 * rep)) | ((x >> 48) & (0x000000000000ffff * rep)))
+
+
+def rotate(x, rot = 1, rep = 1):
+    """ the same as board.rotate """
+    rot = ((rot % 4) + 4) % 4
+    if rot == 1:
+        return reflect_horizontal(transpose(x, rep), rep)
+    if rot == 2:
+        return reflect_vertical(reflect_horizontal(x, rep), rep)
+    if rot == 3:
+        return reflect_vertical(transpose(x, rep), rep)
+    return x
+
+
+def isomorphic(x, rep = 1):
+    """ return the 8 isomorphisms in the same order as weight_agent.lineValue """
+    t = transpose(x, rep)
+    return [rotate(x, i, rep) for i in range(4)] + [rotate(t, i, rep) for i in range(4, 8)]
+
+
+if __name__ == '__main__':
+    print('2048 Demo: bitboard.py\n')
+    pass
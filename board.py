@@ -9,6 +9,10 @@ Author: Hung Guei (moporgic)
 Modifier: Kuo-Hao Ho (lukewayne123)
 """
 
+import bitboard
+import kernel
+
+
 class board:
     """ simple implementation of 2048 puzzle """
     
@@ -40,6 +44,8 @@ class board:
         apply an action to the board
         return the reward of the action, or -1 if the action is illegal
         """
+        if kernel.enabled and max(self.state) < 15:
+            return self.slide_kernel(opcode)
         if opcode == 0:
             return self.slide_up()
         if opcode == 1:
@@ -50,7 +56,20 @@ class board:
             return self.slide_left()
         return -1
     
+    def slide_kernel(self, opcode):
+        """
+        apply an action by the JIT kernel, see kernel.py
+        only for boards without 32768-tiles, which the packed board never merges (see bitboard.slide_row)
+        """
+        raw, score = kernel.slide(kernel.u64(bitboard.pack(self.state)), opcode, kernel.row_left, kernel.row_right, kernel.row_score)
+        if score == -1:
+            return -1
+        self.state = bitboard.unpack(int(raw))
+        return int(score)
+    
     def slide_left(self):
+        if kernel.enabled and max(self.state) < 15:
+            return self.slide_kernel(3)
         move, score = [], 0
         for row in [self.state[r:r+4] for r in range(0, 16, 4)]:
             row, buf = [], [t for t in row if t]
@@ -135,6 +154,10 @@ class board:
         return state
     
     
+# the kernels are checked against board, so they are enabled after the class is defined
+kernel.enable()
+
+
 if __name__ == '__main__':
     print('2048 Demo: board.py\n')
     pass
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""
+Precomputed value tables of restricted 2048 subproblems (Python 3)
+
+usage: endgame.py --save=PATH [--rows=N] [--cap=N] [--workers=N]
+
+the subproblem is the region of the last 'rows' rows of a board played on its
+own: the player slides the region by the board move rules, and the environment
+places a 2-tile (90%) or a 4-tile (10%) into an empty cell of the region, as
+rndenv does; only tiles below 2^cap are allowed, so a move that merges into a
+2^cap tile ends the subproblem with its reward
+
+since sliding keeps the tile sum and placing increases it, the positions are
+solved exactly level by level in decreasing order of tile sum, and the positions
+of a level are split among worker processes writing into the same mmapped table
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from multiprocessing import Pool
+from array import array
+import struct
+import mmap
+import sys
+import os
+
+
+class endgame:
+    """
+    value table of a region subproblem in a memory-mapped file
+    
+    the file is a 16-byte header (magic, rows, cap) followed by float32 values of
+    all positions, where the position of tiles t[0..n) in row-major order of the
+    region is at index sum(t[k] * cap^k), and a value is the expected score
+    obtainable from the position with optimal play, with the player to move
+    """
+    
+    magic = b"2048EGv1"
+    head = struct.Struct("<8sII")
+    
+    def __init__(self, path, writable = False):
+        input = open(path, "r+b" if writable else "rb")
+        self.map = mmap.mmap(input.fileno(), 0, access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        input.close()
+        magic, self.rows, self.cap = endgame.head.unpack_from(self.map, 0)
+        self.cells = 4 * self.rows
+        if magic != endgame.magic or len(self.map) != endgame.head.size + 4 * self.cap ** self.cells:
+            self.map.close()
+            raise ValueError("invalid endgame table: " + path)
+        self.values = memoryview(self.map)[endgame.head.size:].cast('f')
+        return
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return
+    
+    def close(self):
+        if not self.map.closed:
+            self.values.release()
+            self.map.close()
+        return
+    
+    def index(self, tiles):
+        """ return the index of region tiles, or -1 if they are out of the subproblem """
+        index = 0
+        for t in reversed(tiles):
+            if t >= self.cap:
+                return -1
+            index = index * self.cap + t
+        return index
+    
+    def value(self, state):
+        """ return the value of the last rows of a board (board object or list of 16 tiles), or None if out of the subproblem """
+        index = self.index(state[(16 - self.cells):16])
+        return self.values[index] if index >= 0 else None
+    
+    def after_value(self, state):
+        """
+        return the value of the last rows of an afterstate (board object or list of 16 tiles),
+        i.e., the expectation over the 2-tile (90%) and 4-tile (10%) placements into the empty
+        cells of the region as in solve, or None if out of the subproblem or the region is full
+        """
+        tiles = state[(16 - self.cells):16]
+        base = self.index(tiles)
+        empty = [k for k in range(self.cells) if not tiles[k]]
+        if base < 0 or not empty:
+            return None
+        expect = 0.0
+        for k in empty:
+            expect += 0.9 * self.values[base + self.cap ** k] + 0.1 * self.values[base + 2 * self.cap ** k]
+        return expect / len(empty)
+
+
+def slide_line(line):
+    """ slide a line of tiles toward its head, return the line and the reward (the same rules as board.slide_left) """
+    move, buf, score = [], [t for t in line if t], 0
+    while buf:
+        if len(buf) >= 2 and buf[0] == buf[1]:
+            buf = buf[1:]
+            buf[0] += 1
+            score += 1 << buf[0]
+        move += [buf[0]]
+        buf = buf[1:]
+    return move + [0] * (len(line) - len(move)), score
+
+
+def slide_region(tiles, rows, opcode):
+    """ apply an action (board opcode) to region tiles, return the tiles and the reward, or None if illegal """
+    grid = [tiles[r * 4:(r + 1) * 4] for r in range(rows)]
+    if opcode in (1, 3):
+        lines = [row if opcode == 3 else row[::-1] for row in grid]
+    else:
+        lines = [[grid[r][c] for r in range(rows)] for c in range(4)]
+        lines = [col if opcode == 0 else col[::-1] for col in lines]
+    score, slid = 0, []
+    for line in lines:
+        line, reward = slide_line(line)
+        slid += [line]
+        score += reward
+    if opcode in (1, 3):
+        grid = [row if opcode == 3 else row[::-1] for row in slid]
+    else:
+        slid = [col if opcode == 0 else col[::-1] for col in slid]
+        grid = [[slid[c][r] for c in range(4)] for r in range(rows)]
+    moved = [t for row in grid for t in row]
+    return (moved, score) if moved != tiles else None
+
+
+table = None # the table opened by a worker process
+
+def attach(path):
+    global table
+    table = endgame(path, writable = True)
+    return
+
+
+def tiles_of(index, cap, cells):
+    tiles = []
+    for k in range(cells):
+        tiles += [index % cap]
+        index //= cap
+    return tiles
+
+
+def level(task):
+    """ compute the tile sums of a range of indexes """
+    begin, end, cap, cells = task
+    sums = array('L')
+    for index in range(begin, end):
+        sums.append(sum((1 << t) & -2 for t in tiles_of(index, cap, cells)))
+    return sums
+
+
+def solve(indexes):
+    """ solve positions whose successors are solved, and write their values into the table """
+    rows, cap, cells, values = table.rows, table.cap, table.cells, table.values
+    for index in indexes:
+        tiles = tiles_of(index, cap, cells)
+        best = 0.0
+        for opcode in range(4):
+            moved = slide_region(tiles, rows, opcode)
+            if moved is None:
+                continue
+            after, reward = moved
+            if max(after) >= cap:
+                best = max(best, float(reward))
+                continue
+            base = table.index(after)
+            empty = [k for k in range(cells) if not after[k]]
+            expect = 0.0
+            for k in empty:
+                expect += 0.9 * values[base + cap ** k] + 0.1 * values[base + 2 * cap ** k]
+            best = max(best, reward + expect / len(empty))
+        values[index] = best
+    return len(indexes)
+
+
+def build(path, rows = 1, cap = 16, workers = 0, chunk = 1 << 16):
+    """ build the value table of the region of the last 'rows' rows with tiles below 2^cap """
+    if not 1 <= rows <= 4 or cap < 3:
+        raise ValueError("rows must be in [1, 4] and cap must be at least 3")
+    cells = 4 * rows
+    size = cap ** cells
+    output = open(path, "wb")
+    output.write(endgame.head.pack(endgame.magic, rows, cap))
+    output.truncate(endgame.head.size + 4 * size)
+    output.close()
+    
+    with Pool(workers if workers > 0 else None, initializer = attach, initargs = (path,)) as pool:
+        # group the indexes by tile sum with a counting sort
+        sums = array('L')
+        for part in pool.imap(level, [(begin, min(begin + chunk, size), cap, cells) for begin in range(0, size, chunk)]):
+            sums.extend(part)
+        count = {}
+        for s in sums:
+            count[s] = count.get(s, 0) + 1
+        levels, offset, start = sorted(count, reverse = True), 0, {}
+        for s in levels:
+            start[s] = offset
+            offset += count[s]
+        order = array('L', bytes(sums.itemsize * size))
+        fill = dict(start)
+        for index, s in enumerate(sums):
+            order[fill[s]] = index
+            fill[s] += 1
+        del sums
+        
+        # solve the levels in decreasing order of tile sum, where each level only depends on higher levels
+        # small levels are solved in this process since dispatching them costs more than solving them
+        attach(path)
+        split = 4 * (workers if workers > 0 else os.cpu_count() or 1)
+        for s in levels:
+            indexes = order[start[s]:(start[s] + count[s])]
+            if len(indexes) < chunk // 64:
+                solve(indexes)
+                continue
+            step = (len(indexes) + split - 1) // split
+            pool.map(solve, [indexes[i:i + step] for i in range(0, len(indexes), step)])
+        table.close()
+    return True
+
+
+if __name__ == '__main__':
+    print('2048 Endgame: ' + " ".join(sys.argv))
+    print()
+    
+    save, rows, cap, workers = "", 1, 16, 0
+    for para in sys.argv[1:]:
+        if "--save=" in para:
+            save = para[(para.index("=") + 1):]
+        elif "--rows=" in para:
+            rows = int(para[(para.index("=") + 1):])
+        elif "--cap=" in para:
+            cap = int(para[(para.index("=") + 1):])
+        elif "--workers=" in para:
+            workers = int(para[(para.index("=") + 1):])
+    
+    build(save, rows, cap, workers)
+    with endgame(save) as result:
+        print("%d positions of %d rows with tiles below %d saved to %s, max value = %f" %
+              (len(result.values), result.rows, 1 << result.cap, save, max(result.values)))
@@ -121,8 +121,8 @@ class episode:
                 r = self.load_optional_value(minput, "[]")
                 # (?) --> time
                 t = self.load_optional_value(minput, "()")
-                # (action, reward, time)
-                self.ep_moves += [(a, r, t)]
+                # (state, action, reward, time), the same as apply_action
+                self.ep_moves += [(board(self.ep_state), a, r, t)]
             return True
         except (RuntimeError, ValueError, IndexError):
             pass
@@ -143,7 +143,8 @@ class episode:
     
     def __str__(self):
         open = str(self.ep_open[0]) + "@" + str(self.ep_open[1])
-        moves = "".join([str(m[0]) + ("[" + str(m[1]) + "]" if m[1] else "") + ("(" + str(m[2]) + ")" if m[2] else "") for m in self.ep_moves])
+        # the last three fields of a record are action, reward, time usage
+        moves = "".join([str(m[-3]) + ("[" + str(m[-2]) + "]" if m[-2] else "") + ("(" + str(m[-1]) + ")" if m[-1] else "") for m in self.ep_moves])
         close = str(self.ep_close[0]) + "@" + str(self.ep_close[1])
         return open + "|" + moves + "|" + close
     
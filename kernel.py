@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""
+Optional JIT-compiled kernels for board and feature hot paths
+
+when numba (and numpy) is installed, the kernels below are compiled and
+checked against the pure-Python implementations (bitboard, board, and the
+list-based loop of weight_agent.lineValue) by enable() once board is imported,
+and 'enabled' is set if all paths agree; otherwise the callers keep using
+their pure-Python code, so no agent needs to be changed either way
+
+the kernels work on packed boards (see bitboard) and on weight tables
+backed by array('f'), which are shared with numpy without copying
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+import bitboard
+import random
+import copy
+import sys
+
+try:
+    import numpy
+    import numba
+except ImportError:
+    numba = None
+
+enabled = False
+
+
+def table(w):
+    """ return a numpy view of a dense weight table, or None if the table is not array-backed """
+    if not enabled or getattr(w, "value", None) is None or getattr(w.value, "typecode", None) != 'f':
+        return None
+    return numpy.frombuffer(w.value, dtype = numpy.float32)
+
+
+def pack(boards):
+    """ return a numpy array of packed boards from board objects or packed integers """
+    return numpy.array([b if isinstance(b, int) else bitboard.pack(b) for b in boards], dtype = numpy.uint64)
+
+
+if numba is not None:
+    u64 = numpy.uint64
+    m1, m2, m3 = u64(0xf0f00f0ff0f00f0f), u64(0x0000f0f00000f0f0), u64(0x0f0f00000f0f0000)
+    m4, m5, m6 = u64(0xff00ff0000ff00ff), u64(0x00ff00ff00000000), u64(0x00000000ff00ff00)
+    h1, h2 = u64(0x000f000f000f000f), u64(0x00f000f000f000f0)
+    v1, v2 = u64(0x000000000000ffff), u64(0x00000000ffff0000)
+    s4, s12, s16, s24, s32, s48 = u64(4), u64(12), u64(16), u64(24), u64(32), u64(48)
+    
+    @numba.njit(cache = True)
+    def transpose(x):
+        a = (x & m1) | ((x & m2) << s12) | ((x & m3) >> s12)
+        return (a & m4) | ((a & m5) >> s24) | ((a & m6) << s24)
+    
+    @numba.njit(cache = True)
+    def reflect_horizontal(x):
+        return ((x & h1) << s12) | ((x & h2) << s4) | ((x >> s4) & h2) | ((x >> s12) & h1)
+    
+    @numba.njit(cache = True)
+    def reflect_vertical(x):
+        return ((x & v1) << s48) | ((x & v2) << s16) | ((x >> s16) & v2) | ((x >> s48) & v1)
+    
+    @numba.njit(cache = True)
+    def place(x, pos, tile):
+        shift = u64(60 - 4 * pos)
+        return (x & ~(u64(0x0f) << shift)) | (u64(tile) << shift)
+    
+    @numba.njit(cache = True)
+    def slide_rows(x, rows, score):
+        y, reward = u64(0), 0
+        for r in range(4):
+            shift = u64(16 * r)
+            row = (x >> shift) & v1
+            y |= u64(rows[row]) << shift
+            reward += score[row]
+        return y, reward
+    
+    @numba.njit(cache = True)
+    def slide(x, opcode, left, right, score):
+        """ the same as bitboard.slide """
+        if opcode == 0:
+            y, reward = slide_rows(transpose(x), left, score)
+            y = transpose(y)
+        elif opcode == 1:
+            y, reward = slide_rows(x, right, score)
+        elif opcode == 2:
+            y, reward = slide_rows(transpose(x), right, score)
+            y = transpose(y)
+        elif opcode == 3:
+            y, reward = slide_rows(x, left, score)
+        else:
+            return x, -1
+        if y == x:
+            return x, -1
+        return y, reward
+    
+    @numba.njit(cache = True)
+    def line_index(x):
+        """ the same as weight_agent.lineIndex """
+        return (x >> s48) & v1, (x >> s32) & v1
+    
+    @numba.njit(cache = True)
+    def isomorphic(x, i):
+        """ the i-th isomorphism, the same as bitboard.isomorphic(x)[i] """
+        if i >= 4:
+            x = transpose(x)
+        rot = i % 4
+        if rot == 1:
+            return reflect_horizontal(transpose(x))
+        if rot == 2:
+            return reflect_vertical(reflect_horizontal(x))
+        if rot == 3:
+            return reflect_vertical(transpose(x))
+        return x
+    
+    @numba.njit(cache = True)
+    def batch_value(raws, w0, w1):
+        """ the same as weight_agent.batchValue """
+        values = numpy.zeros(raws.shape[0])
+        for j in range(raws.shape[0]):
+            for i in range(8):
+                idx0, idx1 = line_index(isomorphic(raws[j], i))
+                values[j] += w0[idx0] + w1[idx1]
+        return values
+    
+    @numba.njit(cache = True)
+    def batch_update(raws, w0, w1, deltas):
+        """ the same as weight_agent.batchUpdate """
+        for j in range(raws.shape[0]):
+            for i in range(8):
+                idx0, idx1 = line_index(isomorphic(raws[j], i))
+                w0[idx0] += deltas[j]
+                w1[idx1] += deltas[j]
+        return
+
+
+def selftest(trials = 1000):
+    """ verify the kernels against the pure-Python implementations, return True if they agree """
+    from board import board
+    bitboard.prepare()
+    left = numpy.frombuffer(bitboard.row_left, dtype = numpy.uint16)
+    right = numpy.frombuffer(bitboard.row_right, dtype = numpy.uint16)
+    score = numpy.array(bitboard.row_score, dtype = numpy.int64)
+    rng = random.Random(2048)
+    raws = [bitboard.pack([rng.choice([0, 0, 1, 1, 2, 3, 4, 5, 6, 15]) for i in range(16)]) for n in range(trials)]
+    for x in raws:
+        if int(transpose(u64(x))) != bitboard.transpose(x):
+            return False
+        for op in range(4):
+            y, reward = slide(u64(x), op, left, right, score)
+            if (int(y), int(reward)) != bitboard.slide(x, op):
+                return False
+        pos = rng.randrange(16)
+        if int(place(u64(x), pos, 2)) != bitboard.place(x, pos, 2):
+            return False
+    
+    # board objects only use the kernel without 32768-tiles, see board.slide
+    states = [[rng.choice([0, 0, 1, 1, 2, 3, 4, 5, 6, 14]) for i in range(16)] for n in range(trials)]
+    for state in states:
+        for op in range(4):
+            expect = board(state)
+            reward = expect.slide(op)
+            y, r = slide(u64(bitboard.pack(state)), op, left, right, score)
+            if int(r) != reward or bitboard.unpack(int(y)) != expect.state:
+                return False
+    
+    size = 1 << 16
+    w0 = numpy.array([rng.random() for i in range(size)], dtype = numpy.float32)
+    w1 = numpy.array([rng.random() for i in range(size)], dtype = numpy.float32)
+    values = batch_value(numpy.array([bitboard.pack(state) for state in states], dtype = numpy.uint64), w0, w1)
+    for state, value in zip(states, values):
+        # the list-based loop of weight_agent.lineValue
+        expect = 0.0
+        for i in range(8):
+            b = copy.copy(board(state))
+            if (i >= 4):
+                b.transpose()
+            b.rotate(i)
+            idx0 = b[0] << 12 | b[1] << 8 | b[2] << 4 | b[3]
+            idx1 = b[4] << 12 | b[5] << 8 | b[6] << 4 | b[7]
+            expect += float(w0[idx0]) + float(w1[idx1])
+        if abs(value - expect) > 1e-6 * max(abs(expect), 1):
+            return False
+    u0, u1 = w0.copy(), w1.copy()
+    batch_update(numpy.array(raws[0:10], dtype = numpy.uint64), u0, u1, numpy.ones(10, dtype = numpy.float32))
+    for x in raws[0:10]:
+        for y in bitboard.isomorphic(x):
+            w0[y >> 48] += 1
+            w1[(y >> 32) & 0xffff] += 1
+    return bool(numpy.allclose(u0, w0) and numpy.allclose(u1, w1))
+
+
+def enable():
+    """
+    check the kernels by selftest and set 'enabled' if they agree, return 'enabled'
+    this is called by board once it is defined, since the self-test compares against board
+    """
+    global enabled, row_left, row_right, row_score
+    if enabled or numba is None or numba.config.DISABLE_JIT:
+        return enabled
+    enabled = selftest()
+    if enabled:
+        bitboard.prepare()
+        row_left = numpy.frombuffer(bitboard.row_left, dtype = numpy.uint16)
+        row_right = numpy.frombuffer(bitboard.row_right, dtype = numpy.uint16)
+        row_score = numpy.array(bitboard.row_score, dtype = numpy.int64)
+    else:
+        print("kernel: self-test failed, JIT kernels are disabled", file = sys.stderr)
+    return enabled
+
+
+if __name__ == '__main__':
+    print('2048 Demo: kernel.py\n')
+    print("JIT kernels are " + ("enabled" if enable() else "disabled"))
+    pass
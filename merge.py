@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+Merge weight files of independently trained networks (Python 3)
+
+usage: merge.py --save=PATH [--reduce=mean|median|max|min] [--chunk=N] FILE[:WEIGHT]...
+
+the files (saved by weight_agent.save_weights) are read table by table and
+chunk by chunk, so only one chunk of each file is in memory at a time; the
+tables are validated to have the same count, sizes, and formats, and the
+merged network is written in the same format, where 'mean' is weighted by
+the given weights (1 by default) and paged tables treat missing pages as zeros
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from weight import sparse_weight
+from array import array
+import statistics
+import sys
+import os
+
+
+def reducer(name, weights):
+    """ return a function reducing a tuple of values (one per file) into a value """
+    if name == "mean":
+        total = sum(weights)
+        if total == 0:
+            raise ValueError("the total weight of mean is zero")
+        scale = [w / total for w in weights]
+        return lambda values: sum(w * v for w, v in zip(scale, values))
+    if name == "median":
+        return statistics.median
+    if name == "max":
+        return max
+    if name == "min":
+        return min
+    raise ValueError("unknown reduction: " + name)
+
+
+def read(input, typecode, count):
+    data = array(typecode)
+    data.fromfile(input, count)
+    return data
+
+
+def merge_dense(inputs, output, size, reduce, chunk):
+    """ merge the values of a dense table of all inputs chunk by chunk """
+    array('Q', [size]).tofile(output)
+    for begin in range(0, size, chunk):
+        count = min(chunk, size - begin)
+        chunks = [read(input, 'f', count) for input in inputs]
+        array('f', map(reduce, zip(*chunks))).tofile(output)
+    return
+
+
+def merge_sparse(inputs, output, size, reduce):
+    """ merge the pages of a paged table of all inputs, whose pages are saved in increasing order """
+    heads = [read(input, 'Q', 2) for input in inputs] # page bits, page count
+    bits = set(head[0] for head in heads)
+    if len(bits) != 1:
+        raise ValueError("paged tables have different page sizes")
+    bits = bits.pop()
+    remain = [head[1] for head in heads]
+    pages = [None] * len(inputs) # the next (page index, page values) of each input
+    
+    def advance(i):
+        pages[i] = None
+        if remain[i]:
+            remain[i] -= 1
+            key = read(inputs[i], 'Q', 1)[0]
+            pages[i] = key, read(inputs[i], 'f', 1 << bits)
+        return
+    
+    for i in range(len(inputs)):
+        advance(i)
+    # the page count precedes the pages, so it is patched after the pages are written
+    where = output.tell()
+    array('Q', [size | sparse_weight.flag, bits, 0]).tofile(output)
+    zero = array('f', bytes(4 << bits))
+    written = 0
+    while any(page is not None for page in pages):
+        key = min(page[0] for page in pages if page is not None)
+        chunks = [page[1] if page is not None and page[0] == key else zero for page in pages]
+        array('Q', [key]).tofile(output)
+        array('f', map(reduce, zip(*chunks))).tofile(output)
+        written += 1
+        for i, page in enumerate(pages):
+            if page is not None and page[0] == key:
+                advance(i)
+    end = output.tell()
+    output.seek(where + 16)
+    array('Q', [written]).tofile(output)
+    output.seek(end)
+    return
+
+
+def merge(paths, weights, save, name = "mean", chunk = 1 << 16):
+    """
+    merge the weight files into 'save', return the number of tables
+    the result is written to 'save'.tmp and renamed to 'save' only if the merge succeeds
+    """
+    if not save:
+        raise ValueError("no output file is given")
+    if not paths:
+        raise ValueError("no input file is given")
+    if any(os.path.exists(path) and os.path.exists(save) and os.path.samefile(path, save) for path in paths):
+        raise ValueError("the output file is also an input: " + save)
+    reduce = reducer(name, weights)
+    inputs = [open(path, "rb") for path in paths]
+    output = open(save + ".tmp", "wb")
+    try:
+        counts = [read(input, 'L', 1)[0] for input in inputs]
+        if len(set(counts)) != 1:
+            raise ValueError("different numbers of tables: " + str(counts))
+        array('L', [counts[0]]).tofile(output)
+        for t in range(counts[0]):
+            sizes = [read(input, 'Q', 1)[0] for input in inputs]
+            if len(set(size & sparse_weight.flag for size in sizes)) != 1:
+                raise ValueError("different formats (dense or paged) of table %d" % t)
+            if len(set(sizes)) != 1:
+                raise ValueError("different sizes of table %d: %s" % (t, [size & ~sparse_weight.flag for size in sizes]))
+            if sizes[0] & sparse_weight.flag:
+                merge_sparse(inputs, output, sizes[0] & ~sparse_weight.flag, reduce)
+            else:
+                merge_dense(inputs, output, sizes[0], reduce, chunk)
+        for input, path in zip(inputs, paths):
+            if input.read(1):
+                raise ValueError("unexpected data after the last table: " + path)
+    except BaseException:
+        output.close()
+        os.remove(save + ".tmp")
+        raise
+    finally:
+        for input in inputs:
+            input.close()
+    output.close()
+    os.replace(save + ".tmp", save)
+    return counts[0]
+
+
+if __name__ == '__main__':
+    print('2048 Merge: ' + " ".join(sys.argv))
+    print()
+    
+    save, name, chunk = "", "mean", 1 << 16
+    paths, weights = [], []
+    for para in sys.argv[1:]:
+        if "--save=" in para:
+            save = para[(para.index("=") + 1):]
+        elif "--reduce=" in para:
+            name = para[(para.index("=") + 1):]
+        elif "--chunk=" in para:
+            chunk = int(para[(para.index("=") + 1):])
+        else:
+            path, weight = para, 1.0
+            if ":" in para:
+                try:
+                    path, weight = para[:para.rindex(":")], float(para[(para.rindex(":") + 1):])
+                except ValueError:
+                    path, weight = para, 1.0
+            paths += [path]
+            weights += [weight]
+    
+    count = merge(paths, weights, save, name, chunk)
+    print("%d tables of %d files merged (%s) into %s" % (count, len(paths), name, save))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Live metrics export for long-running programs
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import threading
+import time
+import os
+
+
+class metrics:
+    """
+    publish counters and gauges of a running statistic in Prometheus text format
+    
+    the target is either "http:[HOST:]PORT" (served at http://HOST:PORT/metrics, where
+    HOST is 127.0.0.1 by default) or "file:PATH" (rewritten atomically), and the metrics
+    are collected by a background thread every 'interval' seconds from the running totals
+    of the statistic, so the game loop is never touched and the episodes are never scanned
+    """
+    
+    def __init__(self, stat, play = None, target = "", interval = 5):
+        self.stat = stat
+        self.play = play
+        self.target = target
+        self.interval = interval
+        if target.startswith("http:"):
+            host, _, port = target[5:].rpartition(":")
+            if not port.isdigit():
+                raise ValueError("invalid metrics target (expect http:[HOST:]PORT): " + target)
+            self.address = host or "127.0.0.1", int(port)
+        elif target and not (target.startswith("file:") and target[5:]):
+            raise ValueError("invalid metrics target (expect http:[HOST:]PORT or file:PATH): " + target)
+        self.text = ""
+        self.last = None # time, totals, updates of the last collection
+        self.window = None # differences of the totals over the last collection interval with closed episodes
+        self.done = threading.Event()
+        self.thread = None
+        self.server = None
+        return
+    
+    def __enter__(self):
+        if not self.target:
+            return self
+        self.publish()
+        if self.target.startswith("http:"):
+            monitor = self
+            class handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = monitor.text.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                def log_message(self, format, *args):
+                    return
+            self.server = ThreadingHTTPServer(self.address, handler)
+            self.server.daemon_threads = True
+            threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.target:
+            return
+        self.done.set()
+        self.thread.join()
+        self.publish()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        return
+    
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.publish()
+        return
+    
+    def publish(self):
+        """ collect the metrics and publish them to the target """
+        self.text = self.render(self.collect())
+        if self.target.startswith("file:"):
+            path = self.target[5:]
+            output = open(path + ".tmp", "w")
+            output.write(self.text)
+            output.close()
+            os.replace(path + ".tmp", path)
+        return
+    
+    def collect(self):
+        """ return a list of (name, type, help, value) """
+        now = time.time()
+        totals = self.stat.totals # replaced as a whole when an episode closes, see statistic.accumulate
+        updates = getattr(self.play, "updates", None)
+        last = self.last if self.last is not None else (now, totals, updates)
+        elapsed = max(now - last[0], 1e-9)
+        self.last = now, totals, updates
+        
+        # the window is the episodes closed since the last collection, or the last window if none closed
+        if totals[0] != last[1][0] or self.window is None:
+            self.window = [t - l for t, l in zip(totals, last[1])]
+        count, ssc, pop, eop, pdu, edu = self.window[0], self.window[1], self.window[4], self.window[5], self.window[7], self.window[8]
+        
+        result = [
+            ("game_episodes_total", "counter", "episodes completed", totals[0]),
+            ("game_episodes_per_second", "gauge", "episodes per second since the last collection", (totals[0] - last[1][0]) / elapsed),
+            ("game_score_average", "gauge", "average score of the episodes closed since the last collection", ssc / count if count else 0),
+            ("game_player_ops_per_second", "gauge", "player actions per second of the episodes closed since the last collection", pop * 1000 / pdu if pdu else 0),
+            ("game_environment_ops_per_second", "gauge", "environment actions per second of the episodes closed since the last collection", eop * 1000 / edu if edu else 0),
+            ("process_resident_memory_bytes", "gauge", "resident set size of this process", self.rss()),
+        ]
+        if updates is not None:
+            result += [
+                ("game_weight_updates_total", "counter", "weight updates of the player", updates),
+                ("game_weight_updates_per_second", "gauge", "weight updates per second since the last collection", (updates - last[2]) / elapsed),
+            ]
+        return result
+    
+    def render(self, result):
+        """ format the metrics in Prometheus text format """
+        text = ""
+        for name, kind, help, value in result:
+            text += "# HELP %s %s\n" "# TYPE %s %s\n" "%s %s\n" % (name, help, name, kind, name, repr(float(value)))
+        return text
+    
+    def rss(self):
+        try:
+            input = open("/proc/self/statm", "r")
+            pages = int(input.read().split()[1])
+            input.close()
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # peak usage as a fallback
+
+
+if __name__ == '__main__':
+    print('2048 Demo: metrics.py\n')
+    pass
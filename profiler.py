@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Built-in profiling of episodes
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from time import perf_counter
+import threading
+import cProfile
+import sys
+
+
+class profiler:
+    """
+    profile a window of episodes
+    
+    the window is either "N" (the first N episodes) or "A:B" (episodes A to B, 1-based),
+    where the time of each component is measured by the timer returned by timer(), and
+    if an output prefix is given, a cProfile dump (prefix.pstats) and collapsed stacks
+    for flame graphs (prefix.collapsed) are also written; note that cProfile and the
+    sampler then run in the same window, so the time breakdown includes their overhead
+    """
+    
+    components = [ "player.take_action", "rndenv.take_action", "episode.apply_action", "check_for_win", "statistic", "open_episode", "close_episode" ]
+    default = "100" # the window of a bare --profile
+    
+    def __init__(self, window = "", output = "", interval = 0.001):
+        self.begin, self.end = 0, -1
+        if window:
+            bound = window.split(":", 1)
+            self.begin, self.end = (1, int(bound[0])) if len(bound) == 1 else (int(bound[0]), int(bound[1]))
+        self.output = output
+        self.interval = interval
+        self.usage = { name : [0.0, 0] for name in profiler.components } # time, calls
+        self.episodes, self.elapsed = 0, 0.0
+        self.first, self.last = 0.0, 0.0
+        self.profile = None
+        self.stacks = {}
+        self.sampler = None
+        self.samples, self.sampled = 0, 0.0 # the number and the duration of samples
+        self.switch = None # the thread switch interval replaced while sampling
+        self.done = threading.Event()
+        return
+    
+    def active(self, index):
+        """ check whether episode 'index' (1-based) is in the window """
+        return self.begin <= index <= self.end
+    
+    def start(self):
+        if self.output:
+            self.profile = cProfile.Profile()
+            # the sampler needs the GIL to wake up, which is only released every switch interval
+            self.switch = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.switch, self.interval))
+            self.sampler = threading.Thread(target = self.sample, args = (threading.get_ident(),), daemon = True)
+            self.sampler.start()
+            self.profile.enable()
+        return
+    
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+            self.done.set()
+            self.sampler.join()
+            sys.setswitchinterval(self.switch)
+            self.profile.dump_stats(self.output + ".pstats")
+            output = open(self.output + ".collapsed", "w")
+            for stack, count in sorted(self.stacks.items()):
+                output.write("%s %d\n" % (stack, count))
+            output.close()
+        return
+    
+    def sample(self, ident):
+        """ sample the stack of thread 'ident' periodically, and record the real number of samples and duration """
+        begin = perf_counter()
+        while not self.done.wait(self.interval):
+            self.samples += 1
+            self.sampled = perf_counter() - begin
+            frame = sys._current_frames().get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack += ["%s:%s" % (code.co_filename.split("/")[-1], code.co_name)]
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+        return
+    
+    def timer(self, index):
+        """ return the timer of episode 'index' (1-based), which is this profiler in the window, or a no-op timer """
+        if not self.active(index):
+            return profiler.idle
+        if self.episodes == 0:
+            self.start()
+        self.first = self.last = perf_counter()
+        return self
+    
+    def add(self, name):
+        """ charge the time since the last call to component 'name' """
+        t = perf_counter()
+        usage = self.usage[name]
+        usage[0] += t - self.last
+        usage[1] += 1
+        self.last = t
+        return
+    
+    def close(self, stat):
+        """ close the timed episode, and stop at the end of the window """
+        self.elapsed += self.last - self.first
+        self.episodes += 1
+        if stat.count >= self.end or stat.is_finished():
+            self.stop()
+            self.report()
+        return
+    
+    def report(self):
+        """ print the time breakdown of the window """
+        print("profile of %d episodes: %.3f sec, %.3f ms per episode" % (self.episodes, self.elapsed, self.elapsed * 1000 / max(self.episodes, 1)))
+        for name in profiler.components:
+            usage, calls = self.usage[name]
+            print("\t" "%-24s" "%10.3f sec" "\t" "%6.2f%%" "\t" "%10d calls" "\t" "%8.2f us/call" %
+                  (name, usage, usage * 100 / self.elapsed if self.elapsed else 0, calls, usage * 1e6 / calls if calls else 0))
+        if self.output:
+            print("\t" "dump: %s.pstats, %s.collapsed" % (self.output, self.output))
+            print("\t" "samples = %d, interval = %.3f ms (requested %.3f ms)" %
+                  (self.samples, self.sampled * 1000 / max(self.samples, 1), self.interval * 1000))
+            print("\t" "note: the times above include the overhead of cProfile and the sampler")
+        print()
+        return
+
+
+class idle:
+    """ the timer of episodes outside the window, which does nothing """
+    
+    def add(self, name):
+        return
+    
+    def close(self, stat):
+        return
+
+
+profiler.idle = idle()
+
+
+if __name__ == '__main__':
+    print('2048 Demo: profiler.py\n')
+    pass
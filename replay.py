@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Experience replay buffer of afterstates
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+from array import array
+import bitboard
+import random
+
+
+class replay:
+    """
+    FIFO buffer of afterstates in preallocated arrays
+    
+    each entry is a packed afterstate, the reward of the action leading to it, and
+    whether it is the last afterstate of its episode; episodes are pushed as a whole,
+    so the successor of a nonterminal entry is always the next entry in the ring
+    """
+    
+    def __init__(self, capacity = 1 << 20):
+        self.capacity = capacity
+        self.after = array('Q', bytes(8 * capacity))
+        self.reward = array('f', bytes(4 * capacity))
+        self.terminal = array('B', bytes(capacity))
+        self.head = 0 # the next entry to write
+        self.size = 0
+        return
+    
+    def __len__(self):
+        return self.size
+    
+    def push(self, afters, rewards):
+        """ push the afterstates (board objects or packed integers) and rewards of an episode """
+        for i, (after, reward) in enumerate(zip(afters, rewards)):
+            self.after[self.head] = after if isinstance(after, int) else bitboard.pack(after)
+            self.reward[self.head] = reward
+            self.terminal[self.head] = i == len(afters) - 1
+            self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + len(afters), self.capacity)
+        return
+    
+    def sample(self, count, rng = random):
+        """ return the indexes of 'count' entries sampled uniformly with replacement """
+        if not self.size:
+            return []
+        base = (self.head - self.size) % self.capacity
+        return [(base + rng.randrange(self.size)) % self.capacity for i in range(count)]
+    
+    def successor(self, index):
+        """ return the index of the next afterstate of a nonterminal entry """
+        return (index + 1) % self.capacity
+
+
+if __name__ == '__main__':
+    print('2048 Demo: replay.py\n')
+    pass
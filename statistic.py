@@ -12,6 +12,8 @@ Modifier: Kuo-Hao Ho (lukewayne123)
 from board import board
 from action import action
 from episode import episode
+import json
+import os
 
 
 class statistic:
@@ -30,6 +32,8 @@ class statistic:
         self.limit = limit if limit else total
         self.data = []
         self.count = 0
+        self.totals = (0,) * 9 # closed episodes, score sum, max score, steps (all|slide|place), time (all|slide|place)
+        self.output = None # the file object which episodes are appended to as they close, if any
         return
     
     def show(self, tstat = True):
@@ -109,10 +113,21 @@ class statistic:
     
     def close_episode(self, flag = ""):
         self.data[-1].close_episode(flag)
+        self.accumulate(self.data[-1])
+        if self.output is not None:
+            self.output.write(str(self.data[-1]) + "\n")
         if self.count % self.block == 0:
             self.show()
         return
     
+    def accumulate(self, ep):
+        """ add a closed episode to the running totals, which are replaced as a whole for readers in other threads """
+        t = self.totals
+        self.totals = (t[0] + 1, t[1] + ep.score(), max(t[2], ep.score()),
+                       t[3] + ep.step(), t[4] + ep.step(action.slide.type), t[5] + ep.step(action.place.type),
+                       t[6] + ep.time(), t[7] + ep.time(action.slide.type), t[8] + ep.time(action.place.type))
+        return
+    
     def at(self, i):
         return self.data[i]
     
@@ -127,6 +142,53 @@ class statistic:
         output.write(self.__str__())
         return True
     
+    def save_checkpoint(self, path, state = None):
+        """
+        save a compact checkpoint alongside the statistic file at path
+        the checkpoint is a JSON object of the counters, the running totals, the records
+        of the last 'limit' episodes, a JSON-serializable state (e.g., the state of the
+        random generator), and the size and the modified time of the statistic file to
+        detect staleness, so its size does not grow with the number of episodes run
+        """
+        info = os.stat(path)
+        checkpoint = {
+            "total": self.total, "count": self.count, "totals": list(self.totals),
+            "data": [record(ep).pack() for ep in self.data[-self.limit:]],
+            "state": state, "file": [info.st_size, info.st_mtime_ns]
+        }
+        output = open(path + ".ckpt", "w")
+        json.dump(checkpoint, output)
+        output.close()
+        return True
+    
+    def load_checkpoint(self, path):
+        """
+        restore the counters, the running totals, and the records from the checkpoint
+        of the statistic file at path
+        return the saved state, or None if the checkpoint is missing or stale
+        
+        note that the statistic file of a resumed run is appended to as episodes close
+        (see output), so no episode is lost even if the limit is less than the total
+        """
+        try:
+            input = open(path + ".ckpt", "r")
+            checkpoint = json.load(input)
+            input.close()
+            info = os.stat(path)
+            if checkpoint["file"] != [info.st_size, info.st_mtime_ns] or checkpoint["state"] is None:
+                return None
+            data = [record().unpack(rec) for rec in checkpoint["data"]]
+            totals = tuple(checkpoint["totals"])
+            if len(totals) != len(self.totals):
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.data = data[-self.limit:]
+        self.totals = totals
+        self.total = max(self.total, checkpoint["count"])
+        self.count = checkpoint["count"]
+        return checkpoint["state"]
+    
     def load(self, input):
         """ deserialize from a file object """
         self.data = []
@@ -139,10 +201,47 @@ class statistic:
                 break
         self.total = max(self.total, len(self.data))
         self.count = len(self.data)
+        self.totals = (0,) * len(self.totals)
+        for ep in self.data:
+            self.accumulate(ep)
         return True
     
     def __str__(self):
-        return "\n".join([str(ep) for ep in self.data]) + "\n"
+        # records restored from a checkpoint are already in the statistic file
+        return "".join([str(ep) + "\n" for ep in self.data if isinstance(ep, episode)])
+
+
+class record:
+    """ summary of a closed episode, which can be shown but not saved as an episode """
+    
+    def __init__(self, ep = None):
+        if ep is not None:
+            self.ep_score = ep.score()
+            self.ep_state = board(ep.state())
+            self.ep_step = ep.step(), ep.step(action.slide.type), ep.step(action.place.type)
+            self.ep_time = ep.time(), ep.time(action.slide.type), ep.time(action.place.type)
+        return
+    
+    def score(self):
+        return self.ep_score
+    
+    def state(self):
+        return self.ep_state
+    
+    def step(self, who = -1):
+        return self.ep_step[1 if who == action.slide.type else 2 if who == action.place.type else 0]
+    
+    def time(self, who = -1):
+        return self.ep_time[1 if who == action.slide.type else 2 if who == action.place.type else 0]
+    
+    def pack(self):
+        return [self.ep_score, self.ep_state.state, list(self.ep_step), list(self.ep_time)]
+    
+    def unpack(self, data):
+        self.ep_score, state, step, time = data
+        self.ep_state = board(state)
+        self.ep_step, self.ep_time = tuple(step), tuple(time)
+        return self
     
     
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Persistent transposition cache shared by processes
+
+Author: Hung Guei (moporgic)
+        Computer Games and Intelligence (CGI) Lab, NCTU, Taiwan
+        http://www.aigames.nctu.edu.tw
+Modifier: Kuo-Hao Ho (lukewayne123)
+"""
+
+import bitboard
+import hashlib
+import struct
+import mmap
+import sys
+import os
+
+
+class transposition:
+    """
+    fixed-size open-addressing cache of board values in a memory-mapped file
+    
+    the file is a 24-byte header (magic, number of entries, config) followed by 16-byte
+    entries (check, data), where data holds the value (float32) and the depth + 1 (16 bits),
+    and check = key ^ data, so that an entry torn by concurrent writers is simply a miss;
+    the key is the packed board canonicalized over its 8 isomorphisms, an entry only
+    answers a lookup of the same key and the same depth, and a new entry replaces the
+    entry of the same key and depth, an empty entry, or the shallowest entry of its
+    bucket, so many processes can read and write the same file without locks
+    
+    the config is a hash of the search settings other than the depth (e.g., the playout
+    policy), and a file created with another config is rejected, since its values differ
+    """
+    
+    magic = b"2048TTv2"
+    head = struct.Struct("<8sQQ")
+    entry = struct.Struct("<QQ")
+    value = struct.Struct("<f")
+    ways = 4 # entries per bucket
+    full = 0xfffe # the depth of a search to the end
+    
+    def __init__(self, path, entries = 1 << 20, config = None):
+        """ open or create the file at path, where the config is checked unless it is None """
+        tag = int.from_bytes(hashlib.blake2b((config or "").encode(), digest_size = 8).digest(), "little")
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            fd = transposition.create(path, entries, tag)
+        self.map = mmap.mmap(fd, 0)
+        os.close(fd)
+        magic, self.size, stored = transposition.head.unpack_from(self.map, 0)
+        if magic != transposition.magic or len(self.map) != transposition.head.size + self.size * transposition.entry.size:
+            self.map.close()
+            raise ValueError("invalid transposition file: " + path)
+        if config is not None and stored != tag:
+            self.map.close()
+            raise ValueError("transposition file of another config: " + path)
+        self.shift = 64 - (self.size.bit_length() - 1)
+        self.lookups = {} # depth -> lookups
+        self.hits = {} # depth -> hits
+        return
+    
+    @staticmethod
+    def create(path, entries, config):
+        """
+        create a file with its header under a temporary name and link it into place,
+        so other processes never see a file without the header; return the opened file
+        """
+        size = 1 << max(entries - 1, transposition.ways).bit_length()
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        fd = os.open(temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, transposition.head.size + size * transposition.entry.size)
+            os.pwrite(fd, transposition.head.pack(transposition.magic, size, config), 0)
+            os.link(temp, path)
+        except FileExistsError:
+            # created by another process in the meantime
+            os.close(fd)
+            fd = os.open(path, os.O_RDWR)
+        except BaseException:
+            os.close(fd)
+            raise
+        finally:
+            os.unlink(temp)
+        return fd
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return
+    
+    def close(self):
+        if not self.map.closed:
+            self.map.flush()
+            self.map.close()
+        return
+    
+    def key(self, state):
+        """ return the canonical key of a board (board object or packed integer) """
+        x = state if isinstance(state, int) else bitboard.pack(state)
+        return min(bitboard.isomorphic(x))
+    
+    def bucket(self, key):
+        """ return the offset of the first entry of the bucket of a key """
+        index = ((key * 0x9e3779b97f4a7c15) & 0xffffffffffffffff) >> self.shift
+        index = min(index, self.size - transposition.ways)
+        return transposition.head.size + index * transposition.entry.size
+    
+    def lookup(self, state, depth = 0):
+        """ return the cached value of a board searched exactly 'depth', or None if missed """
+        key = self.key(state)
+        self.lookups[depth] = self.lookups.get(depth, 0) + 1
+        offset = self.bucket(key)
+        for i in range(transposition.ways):
+            check, data = transposition.entry.unpack_from(self.map, offset + i * transposition.entry.size)
+            if data and check ^ data == key and (data & 0xffff) - 1 == depth:
+                self.hits[depth] = self.hits.get(depth, 0) + 1
+                return transposition.value.unpack((data >> 32).to_bytes(4, "little"))[0]
+        return None
+    
+    def store(self, state, value, depth = 0):
+        """ store the value of a board searched 'depth', which may be replaced later """
+        key = self.key(state)
+        data = (int.from_bytes(transposition.value.pack(value), "little") << 32) | (min(depth, transposition.full) + 1)
+        offset = self.bucket(key)
+        target, shallowest = None, None
+        for i in range(transposition.ways):
+            where = offset + i * transposition.entry.size
+            check, old = transposition.entry.unpack_from(self.map, where)
+            if not old or (check ^ old == key and (old & 0xffff) == (data & 0xffff)):
+                target = where
+                break
+            if shallowest is None or (old & 0xffff) < shallowest[1]:
+                shallowest = where, old & 0xffff
+        if target is None:
+            target = shallowest[0]
+        transposition.entry.pack_into(self.map, target, key ^ data, data)
+        return True
+    
+    def occupancy(self):
+        """ return the number of used entries """
+        used = 0
+        for i in range(self.size):
+            check, data = transposition.entry.unpack_from(self.map, transposition.head.size + i * transposition.entry.size)
+            used += 1 if data else 0
+        return used
+    
+    def report(self):
+        """ print the hit rates per depth of this process """
+        for depth in sorted(self.lookups):
+            lookups, hits = self.lookups[depth], self.hits.get(depth, 0)
+            print("cache" "\t" "depth = %s" "\t" "lookups = %d" "\t" "hits = %d" "\t" "(%.2f%%)" %
+                  ("full" if depth == transposition.full else depth, lookups, hits, hits * 100 / lookups))
+        return
+
+
+if __name__ == '__main__':
+    print('2048 Demo: transposition.py\n')
+    for path in sys.argv[1:]:
+        with transposition(path) as cache:
+            used = cache.occupancy()
+            print("%s" "\t" "entries = %d" "\t" "used = %d" "\t" "(%.2f%%)" % (path, cache.size, used, used * 100 / cache.size))
+    pass
@@ -10,12 +10,13 @@ Modifier: Kuo-Hao Ho (lukewayne123)
 """
 
 from array import array
+import struct
 
 
 class weight:
     
     def __init__(self, len = 0):
-        self.value = [0] * len
+        self.value = array('f', bytes(4 * len))
         return
     
     def __getitem__(self, index):
@@ -36,11 +37,172 @@ class weight:
     
     def load(self, input):
         """ deserialize from a file object """
+        ipt = input.tell()
         size = array('Q')
         size.fromfile(input, 1)
         size = size[0]
+        if size & sparse_weight.flag:
+            input.seek(ipt)
+            return False
         value = array('f')
         value.fromfile(input, size)
-        self.value = list(value)
+        self.value = value
         return True
-    
\ No newline at end of file
+    
+
+
+class quantized_weight(weight):
+    """
+    reduced-precision weight table for evaluation-only agents
+    float16: IEEE half precision, 2 bytes per entry
+    int16: 16-bit fixed point with a per-table scale, 2 bytes per entry
+    
+    the file format is the same as weight, i.e., values are saved as float32
+    and loaded from float32 files with conversion
+    """
+    
+    modes = [ "float16", "int16" ]
+    half = None # decode table of all 65536 float16 bit patterns
+    
+    def __init__(self, len = 0, mode = "float16"):
+        if mode not in quantized_weight.modes:
+            raise ValueError("unknown quantization mode: " + str(mode))
+        if mode == "float16" and quantized_weight.half is None:
+            quantized_weight.half = list(struct.unpack("%de" % 65536, array('H', range(65536)).tobytes()))
+        self.mode = mode
+        self.scale = 1.0
+        self.value = array('H' if mode == "float16" else 'h', bytes(2 * len))
+        return
+    
+    def __getitem__(self, index):
+        if self.mode == "float16":
+            return quantized_weight.half[self.value[index]]
+        return self.value[index] * self.scale
+    
+    def __setitem__(self, index, value):
+        self.value[index] = self.encode(value)
+        return
+    
+    def encode(self, value):
+        """ quantize a float to the stored integer representation """
+        if self.mode == "float16":
+            value = max(min(value, 65504.0), -65504.0)
+            return struct.unpack('H', struct.pack('e', value))[0]
+        return max(min(int(round(value / self.scale)), 32767), -32767)
+    
+    def convert(self, source):
+        """ quantize all values of a full-precision weight """
+        values = source.value
+        if self.mode == "int16":
+            peak = max(map(abs, values), default = 0.0)
+            self.scale = peak / 32767 if peak else 1.0
+        self.value = array(self.value.typecode, map(self.encode, values))
+        return self
+    
+    def error(self, reference):
+        """ return the (max, mean, rms) absolute error against a full-precision weight """
+        emax, esum, esqr = 0.0, 0.0, 0.0
+        for i, v in enumerate(reference.value):
+            e = abs(self[i] - v)
+            emax = max(emax, e)
+            esum += e
+            esqr += e * e
+        size = max(len(reference), 1)
+        return emax, esum / size, (esqr / size) ** 0.5
+    
+    def save(self, output):
+        """ serialize this weight to a file object (as float32) """
+        array('Q', [len(self.value)]).tofile(output)
+        array('f', (self[i] for i in range(len(self.value)))).tofile(output)
+        return True
+    
+    def load(self, input):
+        """ deserialize from a float32 file object with quantization """
+        source = weight()
+        if not source.load(input):
+            return False
+        self.convert(source)
+        return True
+    
+
+
+class sparse_weight(weight):
+    """
+    paged weight table for large features
+    a page of entries is allocated on its first nonzero write,
+    and entries of untouched pages are read as zero
+    
+    the file format stores only populated pages:
+    size | flag, page bits, page count, then (page index, page values) for each page
+    """
+    
+    flag = 1 << 63
+    
+    def __init__(self, len = 0, page = 4096):
+        self.size = len
+        self.bits = max(page - 1, 1).bit_length()
+        self.mask = (1 << self.bits) - 1
+        self.pages = {}
+        return
+    
+    def __getitem__(self, index):
+        page = self.pages.get(index >> self.bits)
+        return page[index & self.mask] if page is not None else 0.0
+    
+    def __setitem__(self, index, value):
+        page = self.pages.get(index >> self.bits)
+        if page is None:
+            if not value:
+                return
+            page = array('f', bytes(4 << self.bits))
+            self.pages[index >> self.bits] = page
+        page[index & self.mask] = value
+        return
+    
+    def __len__(self):
+        return self.size
+    
+    def occupancy(self):
+        """ return the (allocated pages, total pages, allocated bytes) of this weight """
+        total = (self.size + self.mask) >> self.bits
+        return len(self.pages), total, len(self.pages) * (4 << self.bits)
+    
+    def save(self, output):
+        """ serialize the populated pages of this weight to a file object """
+        array('Q', [self.size | sparse_weight.flag, self.bits, len(self.pages)]).tofile(output)
+        for key in sorted(self.pages):
+            array('Q', [key]).tofile(output)
+            self.pages[key].tofile(output)
+        return True
+    
+    def load(self, input):
+        """ deserialize from a file object """
+        ipt = input.tell()
+        head = array('Q')
+        head.fromfile(input, 1)
+        if not head[0] & sparse_weight.flag:
+            input.seek(ipt)
+            return False
+        head.fromfile(input, 2)
+        self.size = head[0] & ~sparse_weight.flag
+        self.bits = head[1]
+        self.mask = (1 << self.bits) - 1
+        self.pages = {}
+        for i in range(head[2]):
+            key = array('Q')
+            key.fromfile(input, 1)
+            page = array('f')
+            page.fromfile(input, 1 << self.bits)
+            self.pages[key[0]] = page
+        return True
+
+
+weight.prototype = [weight, sparse_weight]
+def parse(input):
+    """ deserialize a weight of any stored format from a file object """
+    for proto in weight.prototype:
+        w = proto()
+        if w.load(input):
+            return w
+    raise ValueError("unknown weight format")
+weight.parse = parse